@@ -0,0 +1,73 @@
+# Thin client for the pipeline service (see service.py). Only standard library modules are
+# imported so it starts instantly; OpenCV, pandas and the pipelines stay loaded in the service.
+import argparse
+import json
+import os
+import socket
+import sys
+
+SOCKET_PATH = "/tmp/week2-pipeline.sock"
+
+
+def submit(job, socket_path=SOCKET_PATH):
+    """
+    Send a batch job to the pipeline service and wait for its result.
+
+    Args:
+        job (dict): The job, with input_folder, output_folder, csv_filename and an
+            optional pipeline spec.
+        socket_path (str): Path of the Unix socket the service listens on.
+
+    Returns:
+        dict: The response of the service, with a "status" key of "ok" or "error".
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(job).encode("utf-8") + b"\n")
+        with connection.makefile("rb") as response:
+            return json.loads(response.readline())
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments of the client.
+
+    Args:
+        argv (list, optional): Arguments to parse, defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Submit a batch job to the pipeline service.")
+    parser.add_argument("input_folder", nargs="?", default="pictures")
+    parser.add_argument("output_folder", nargs="?", default="out")
+    parser.add_argument("--csv", default="image_dataframe.csv", help="CSV file to write.")
+    parser.add_argument("--spec", help="JSON file with the pipeline spec to use.")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket of the service.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Main function to submit a job built from the command line and print its result.
+
+    Returns:
+        int: The exit code, 0 on success and 1 on error.
+    """
+    args = parse_args(argv)
+    # The service runs in its own working directory, so send absolute paths.
+    job = {
+        "input_folder": os.path.abspath(args.input_folder),
+        "output_folder": os.path.abspath(args.output_folder),
+        "csv_filename": os.path.abspath(args.csv),
+    }
+    if args.spec is not None:
+        with open(args.spec) as spec_file:
+            job["spec"] = json.load(spec_file)
+    result = submit(job, args.socket)
+    print(json.dumps(result))
+    return 0 if result["status"] == "ok" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
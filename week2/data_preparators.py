@@ -6,8 +6,14 @@ class DataPreparator:
 
     This class provides a framework for preparing data and should be subclassed
     to implement specific data preparation techniques.
+
+    Attributes:
+        channel_wise (bool): True if converting to grayscale before or after the operation
+            gives exactly the same result.
     """
 
+    channel_wise = False
+
     def __init__(self):
         """Initialize the data preparator."""
         pass
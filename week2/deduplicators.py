@@ -0,0 +1,150 @@
+import cv2 as cv
+import numpy as np
+
+from processors import to_gray
+
+# Side of the thumbnail the image is shrunk to before hashing, so hashing cost does not
+# grow with the size of the picture.
+THUMBNAIL_SIZE = 64
+
+
+def dhash(data, hash_size=8):
+    """
+    Compute the difference hash (dHash) of an image.
+
+    The image is first shrunk to a small thumbnail with a cheap linear resize, then converted
+    to grayscale and downscaled to (hash_size + 1, hash_size); each bit of the hash records
+    whether a pixel is brighter than its right neighbour.
+
+    Args:
+        data (numpy.ndarray): The image data to be hashed.
+        hash_size (int): Number of rows (and columns compared) in the hash grid.
+
+    Returns:
+        int: The perceptual hash packed into an integer of hash_size * hash_size bits.
+    """
+    _data = cv.resize(data, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv.INTER_LINEAR)
+    _data = to_gray(_data)
+    _data = cv.resize(_data, (hash_size + 1, hash_size), interpolation=cv.INTER_AREA)
+    bits = (_data[:, 1:] > _data[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(hash1, hash2):
+    """
+    Count the number of differing bits between two hashes.
+
+    Args:
+        hash1 (int): First hash.
+        hash2 (int): Second hash.
+
+    Returns:
+        int: The Hamming distance between both hashes.
+    """
+    return bin(hash1 ^ hash2).count("1")
+
+
+class HashIndex:
+    """
+    A BK-tree indexing hashes for fast Hamming-distance lookups.
+
+    Each node stores a hash, the key it was added with and its children keyed by
+    their distance to the node, so a search only visits subtrees that can hold a match.
+
+    Attributes:
+        root (list): Root node as [hash, key, children], or None when the index is empty.
+        size (int): Number of hashes stored in the index.
+    """
+
+    def __init__(self):
+        """Initialize an empty hash index."""
+        self.root = None
+        self.size = 0
+
+    def add(self, hash_value, key):
+        """
+        Adds a hash to the index.
+
+        Args:
+            hash_value (int): The hash to be indexed.
+            key: The value returned by `find` when this hash matches.
+        """
+        self.size += 1
+        if self.root is None:
+            self.root = [hash_value, key, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_value, key, {}]
+                return
+            node = child
+
+    def find(self, hash_value, max_distance):
+        """
+        Finds the closest indexed hash within the given distance.
+
+        Args:
+            hash_value (int): The hash to look up.
+            max_distance (int): Maximum Hamming distance for a match.
+
+        Returns:
+            tuple: The (key, distance) of the closest match, or None if nothing is close enough.
+        """
+        best = None
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node_hash, node_key, children = nodes.pop()
+            distance = hamming_distance(hash_value, node_hash)
+            if distance <= max_distance and (best is None or distance < best[1]):
+                best = (node_key, distance)
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) <= max_distance:
+                    nodes.append(child)
+        return best
+
+    def __len__(self):
+        return self.size
+
+
+class PerceptualDeduplicator:
+    """
+    Detects near-duplicate images by comparing their perceptual hashes.
+
+    Attributes:
+        max_distance (int): Maximum Hamming distance for two images to be considered duplicates.
+        hash_size (int): Size of the dHash grid.
+        index (HashIndex): Index of the hashes of every image seen so far.
+    """
+
+    def __init__(self, max_distance, hash_size=8):
+        """
+        Initialize the PerceptualDeduplicator.
+
+        Args:
+            max_distance (int): Maximum Hamming distance for two images to be considered duplicates.
+            hash_size (int): Size of the dHash grid, the hash has hash_size * hash_size bits.
+        """
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.index = HashIndex()
+
+    def check(self, data, key):
+        """
+        Checks whether an image duplicates one already seen, indexing it otherwise.
+
+        Args:
+            data (numpy.ndarray): The image data to be checked.
+            key: Identifier of the image (e.g. its path), returned for later duplicates.
+
+        Returns:
+            The key of the image this one duplicates, or None if it is new.
+        """
+        hash_value = dhash(data, self.hash_size)
+        match = self.index.find(hash_value, self.max_distance)
+        if match is not None:
+            return match[0]
+        self.index.add(hash_value, key)
+        return None
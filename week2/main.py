@@ -1,30 +1,52 @@
 import os
 import cv2 as cv
-import pandas as pd
 import logging
 
 from pipeline import ProcessingPipeline
-import processors as pr
-import data_preparators as dp
-import augmenters as ag
+from deduplicators import PerceptualDeduplicator
+from scheduler import MemoryBudgetScheduler
 
 INPUT_FOLDER = "pictures"
 OUTPUT_FOLDER = "out"
+CSV_FILENAME = "image_dataframe.csv"
+# Maximum dHash Hamming distance to treat an input as a duplicate (e.g. 5); None disables
+# deduplication. Hashing costs a few percent of the processing time, so only enable it for
+# folders that do hold duplicates.
+DEDUP_MAX_DISTANCE = None
+# Maximum estimated bytes of images in flight; None loads every picture up front.
+MEMORY_BUDGET_BYTES = 512 * 1024 * 1024
+
+PIPELINE_SPEC = {
+    "data_preparators": [
+        {"type": "ResizeDataPreparator", "params": {"size": [400, 400]}},
+    ],
+    "processors": [
+        # Blur and invert run on one channel, as Canny only uses the intensity.
+        {"type": "GrayscaleProcessor", "params": {}},
+        {"type": "GaussianBlurProcessor", "params": {"kernel_size": [5, 5]}},
+        {"type": "InvertProcessor", "params": {}},
+        {"type": "CannyProcessor", "params": {"threshold1": 100, "threshold2": 200}},
+    ],
+    "augmenters": [
+        {"type": "RotateAugmenter", "params": {"angle": 90}},
+        {"type": "RotateAugmenter", "params": {"angle": 45}},
+        {"type": "FlipAugmenter", "params": {"flip_code": 1}},
+        {"type": "FlipAugmenter", "params": {"flip_code": 0}},
+    ],
+}
 
 logging.basicConfig(level=logging.INFO)
 
 
-def load_pictures(input_folder):
+def list_pictures(input_folder):
     """
-    Load images from the specified folder with extensions png, jpg, or jpeg.
+    List the images in the specified folder with extensions png, jpg, or jpeg.
 
     Args:
-        input_folder (str): The directory from which to load images.
+        input_folder (str): The directory in which to look for images.
 
     Returns:
-        tuple: A tuple containing:
-            - List of loaded images as NumPy arrays.
-            - List of file paths corresponding to the loaded images.
+        list: File paths of the images found.
     """
     picture_paths = [
         os.path.join(input_folder, f)
@@ -32,37 +54,52 @@ def load_pictures(input_folder):
         if f.lower().endswith(("png", "jpg", "jpeg"))
     ]
     logging.info(f"Found {len(picture_paths)} pictures in the folder {input_folder}.")
+    return picture_paths
+
+
+def load_pictures(input_folder):
+    """
+    Load images from the specified folder with extensions png, jpg, or jpeg.
+
+    Args:
+        input_folder (str): The directory from which to load images.
+
+    Returns:
+        tuple: A tuple containing:
+            - List of loaded images as NumPy arrays.
+            - List of file paths corresponding to the loaded images.
+    """
+    picture_paths = list_pictures(input_folder)
     return [cv.imread(path) for path in picture_paths], picture_paths
 
 
-def initialize_pipeline():
+def initialize_pipeline(spec=PIPELINE_SPEC):
     """
     Initialize the processing pipeline with specific processors, preparators, and augmenters.
 
+    Args:
+        spec (dict): Declarative pipeline spec, see `ProcessingPipeline.from_spec`.
+
     Returns:
         ProcessingPipeline: An instance of the ProcessingPipeline configured with necessary components.
     """
-    pipeline = ProcessingPipeline()
-    pipeline.add_processor(pr.GaussianBlurProcessor((5, 5)))
-    pipeline.add_processor(pr.InvertProcessor())
-    pipeline.add_processor(pr.CannyProcessor(100, 200))
-    pipeline.add_data_preparator(dp.ResizeDataPreparator((400, 400)))
-    pipeline.add_augmenter(ag.RotateAugmenter(90))
-    pipeline.add_augmenter(ag.RotateAugmenter(45))
-    pipeline.add_augmenter(ag.FlipAugmenter(1))
-    pipeline.add_augmenter(ag.FlipAugmenter(0))
+    pipeline = ProcessingPipeline.from_spec(spec)
+    logging.info(f"Initialized pipeline {pipeline.spec_hash()[:12]}.")
     return pipeline
 
 
-def process_images(pipeline, pictures, picture_paths, output_folder):
+def process_images(pipeline, pictures, picture_paths, output_folder, deduplicator=None):
     """
     Process each image using the provided pipeline and save the processed images.
 
     Args:
         pipeline (ProcessingPipeline): The image processing pipeline.
-        pictures (list): List of images (as NumPy arrays) to process.
+        pictures (iterable): Images (as NumPy arrays) to process, e.g. a list or the
+            lazy loader of a MemoryBudgetScheduler.
         picture_paths (list): List of file paths corresponding to each image.
         output_folder (str): Directory to save processed images.
+        deduplicator (PerceptualDeduplicator, optional): Skips images that duplicate one
+            already processed, recording the link instead of processing them.
 
     Returns:
         list: A list containing information about the processed images.
@@ -70,16 +107,31 @@ def process_images(pipeline, pictures, picture_paths, output_folder):
     categories = {"articfox", "cat", "dog", "redpanda", "squirrel"}
     processed_info = []
 
-    for idx, (image, path) in enumerate(zip(pictures, picture_paths)):
-        category = path.split(os.sep)[-1].split("_")[0]
-        if category not in categories:
-            logging.warning(f"Category {category} not in the list. Skipping...")
-            continue
-
-        processed_images = pipeline.run(image)
-        save_processed_images(
-            processed_images, category, idx, output_folder, processed_info
-        )
+    # Images are fetched one at a time rather than through zip, which would still hold the
+    # previous image while a MemoryBudgetScheduler hands its bytes back to the loader.
+    pictures = iter(pictures)
+    for idx, path in enumerate(picture_paths):
+        image = next(pictures)
+        try:
+            category = path.split(os.sep)[-1].split("_")[0]
+            if category not in categories:
+                logging.warning(f"Category {category} not in the list. Skipping...")
+                continue
+
+            if deduplicator is not None:
+                duplicate_of = deduplicator.check(image, path)
+                if duplicate_of is not None:
+                    logging.info(f"{path} is a duplicate of {duplicate_of}. Skipping...")
+                    processed_info.append((path, "duplicate", category, duplicate_of))
+                    continue
+
+            save_processed_images(
+                pipeline.run(image), category, idx, output_folder, processed_info
+            )
+        finally:
+            # Drop every reference to the image before the next one is requested.
+            del image
+            pipeline.clear_timeline()
 
     return processed_info
 
@@ -102,7 +154,7 @@ def save_processed_images(
         file_name = f"{category}_{index}_{idx}.jpg"
         path = os.path.join(output_folder, file_name)
         cv.imwrite(path, image)
-        processed_info.append((path, types[1 if idx == 0 else 2], category))
+        processed_info.append((path, types[1 if idx == 0 else 2], category, None))
 
 
 def save_to_csv(data, filename):
@@ -113,19 +165,63 @@ def save_to_csv(data, filename):
         data (list): Data to be saved.
         filename (str): Name of the file to save the data.
     """
-    df = pd.DataFrame(data, columns=["image", "type", "category"])
+    # pandas is only needed here, import it lazily to keep startup fast.
+    import pandas as pd
+
+    df = pd.DataFrame(data, columns=["image", "type", "category", "duplicate_of"])
     df.to_csv(filename)
     logging.info(f"Saved processed data to {filename}")
 
 
+def run_batch(
+    pipeline,
+    input_folder,
+    output_folder,
+    csv_filename,
+    memory_budget=MEMORY_BUDGET_BYTES,
+):
+    """
+    Load the pictures of a folder, process them through the pipeline, and save the results.
+
+    Args:
+        pipeline (ProcessingPipeline): The image processing pipeline.
+        input_folder (str): The directory from which to load images.
+        output_folder (str): Directory to save processed images.
+        csv_filename (str): Name of the CSV file describing the processed images.
+        memory_budget (int, optional): Maximum estimated bytes of images in flight;
+            None loads every picture up front.
+
+    Returns:
+        list: A list containing information about the processed images.
+    """
+    if memory_budget is not None:
+        picture_paths = list_pictures(input_folder)
+        scheduler = MemoryBudgetScheduler(pipeline, memory_budget)
+        pictures = scheduler.load_pictures(picture_paths)
+    else:
+        pictures, picture_paths = load_pictures(input_folder)
+    deduplicator = (
+        PerceptualDeduplicator(DEDUP_MAX_DISTANCE)
+        if DEDUP_MAX_DISTANCE is not None
+        else None
+    )
+    try:
+        processed_info = process_images(
+            pipeline, pictures, picture_paths, output_folder, deduplicator
+        )
+    finally:
+        # Stop the background loader right away if processing failed partway.
+        if memory_budget is not None:
+            pictures.close()
+    save_to_csv(processed_info, csv_filename)
+    return processed_info
+
+
 def main():
     """
     Main function to load pictures, process them through the pipeline, and save the results.
     """
-    pictures, picture_paths = load_pictures(INPUT_FOLDER)
-    pipeline = initialize_pipeline()
-    processed_info = process_images(pipeline, pictures, picture_paths, OUTPUT_FOLDER)
-    save_to_csv(processed_info, "image_dataframe.csv")
+    run_batch(initialize_pipeline(), INPUT_FOLDER, OUTPUT_FOLDER, CSV_FILENAME)
 
 
 if __name__ == "__main__":
@@ -1,3 +1,90 @@
+import hashlib
+import json
+
+import processors as pr
+import data_preparators as dp
+import augmenters as ag
+
+# Registry of the stage classes a pipeline spec can reference, grouped by pipeline section.
+STAGE_REGISTRY = {
+    "data_preparators": {
+        cls.__name__: cls for cls in (dp.ResizeDataPreparator, dp.NormalizeOpencvImage)
+    },
+    "processors": {
+        cls.__name__: cls
+        for cls in (
+            pr.GrayscaleProcessor,
+            pr.GaussianBlurProcessor,
+            pr.MeanAdaptiveThresholdProcessor,
+            pr.InvertProcessor,
+            pr.CannyProcessor,
+        )
+    },
+    "augmenters": {
+        cls.__name__: cls for cls in (ag.RotateAugmenter, ag.FlipAugmenter)
+    },
+}
+
+
+def register_stage(section, cls):
+    """
+    Registers a stage class so it can be referenced from pipeline specs.
+
+    Args:
+        section (str): Pipeline section of the stage: "data_preparators", "processors" or "augmenters".
+        cls (type): The stage class, its constructor arguments must match its attribute names.
+    """
+    STAGE_REGISTRY[section][cls.__name__] = cls
+
+
+def _stage_to_spec(section, stage):
+    """
+    Serializes a stage into a JSON-compatible dict.
+
+    Args:
+        section (str): Pipeline section of the stage.
+        stage: The stage object to serialize.
+
+    Raises:
+        ValueError: If the stage class is not registered in the section.
+
+    Returns:
+        dict: The stage spec, as {"type": class name, "params": constructor arguments}.
+    """
+    name = type(stage).__name__
+    if STAGE_REGISTRY[section].get(name) is not type(stage):
+        raise ValueError(f"{name} is not registered in {section}.")
+    params = {
+        key: list(value) if isinstance(value, tuple) else value
+        for key, value in vars(stage).items()
+    }
+    return {"type": name, "params": params}
+
+
+def _stage_from_spec(section, spec):
+    """
+    Builds a stage from its spec.
+
+    Args:
+        section (str): Pipeline section of the stage.
+        spec (dict): The stage spec, as produced by `_stage_to_spec`.
+
+    Raises:
+        ValueError: If the stage type is not registered in the section.
+
+    Returns:
+        The stage object.
+    """
+    cls = STAGE_REGISTRY[section].get(spec["type"])
+    if cls is None:
+        raise ValueError(f"Unknown {section} type {spec['type']}.")
+    params = {
+        key: tuple(value) if isinstance(value, list) else value
+        for key, value in spec.get("params", {}).items()
+    }
+    return cls(**params)
+
+
 class ProcessingPipeline:
     """
     A flexible pipeline for processing data through a series of processors,
@@ -51,6 +138,39 @@ class ProcessingPipeline:
         """
         self.augmenters.append(augmenter)
 
+    def plan_channels(self):
+        """
+        Finds where a single BGR to grayscale conversion can be inserted in the pipeline.
+
+        The first stage that reduces the image to gray only depends on intensity, so the
+        conversion can be moved before it, past every preceding channel-wise stage, and those
+        stages then run on one channel instead of three. Channel-wise stages give exactly the
+        same result on either side of the conversion, so planning never changes the output.
+
+        Returns:
+            tuple: The (section, index) of the stage before which the data is converted to
+            grayscale, section being "data_preparators" or "processors", or None if no
+            conversion is needed.
+        """
+        stages = [
+            ("data_preparators", idx, stage) for idx, stage in enumerate(self.data_preparators)
+        ] + [("processors", idx, stage) for idx, stage in enumerate(self.processors)]
+        for position, (_, _, stage) in enumerate(stages):
+            if getattr(stage, "reduces_to_gray", False):
+                break
+        else:
+            return None
+        start = position
+        while start > 0:
+            previous = stages[start - 1][2]
+            if not getattr(previous, "channel_wise", False):
+                break
+            start -= 1
+        if start == position:
+            return None
+        section, idx, _ = stages[start]
+        return section, idx
+
     def process(self, data):
         """
         Processes the given data through all processors in the pipeline.
@@ -62,8 +182,11 @@ class ProcessingPipeline:
             The processed data.
         """
         _data = data
+        gray_at = self.plan_channels()
         self.processors_timeline = [data]
-        for processor in self.processors:
+        for idx, processor in enumerate(self.processors):
+            if gray_at == ("processors", idx):
+                _data = pr.to_gray(_data)
             _data = processor.process(_data)
             self.processors_timeline.append(_data)
         return _data
@@ -79,8 +202,11 @@ class ProcessingPipeline:
             The prepared data.
         """
         _data = data
+        gray_at = self.plan_channels()
         self.data_preparators_timeline = [data]
-        for data_preparator in self.data_preparators:
+        for idx, data_preparator in enumerate(self.data_preparators):
+            if gray_at == ("data_preparators", idx):
+                _data = pr.to_gray(_data)
             _data = data_preparator.prepare_data(_data)
             self.data_preparators_timeline.append(_data)
         return _data
@@ -116,6 +242,51 @@ class ProcessingPipeline:
         _augmented_data_array = self.augment(_data)
         return _augmented_data_array
 
+    def to_spec(self):
+        """
+        Serializes the pipeline configuration into a JSON-compatible dict.
+
+        Returns:
+            dict: The pipeline spec, with a list of stage specs for each section.
+        """
+        return {
+            "data_preparators": [
+                _stage_to_spec("data_preparators", stage) for stage in self.data_preparators
+            ],
+            "processors": [_stage_to_spec("processors", stage) for stage in self.processors],
+            "augmenters": [_stage_to_spec("augmenters", stage) for stage in self.augmenters],
+        }
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        Builds a pipeline from its spec.
+
+        Args:
+            spec (dict): The pipeline spec, as produced by `to_spec`. Missing sections are left empty.
+
+        Returns:
+            ProcessingPipeline: A new pipeline configured with the stages of the spec.
+        """
+        pipeline = cls()
+        for stage_spec in spec.get("data_preparators", []):
+            pipeline.add_data_preparator(_stage_from_spec("data_preparators", stage_spec))
+        for stage_spec in spec.get("processors", []):
+            pipeline.add_processor(_stage_from_spec("processors", stage_spec))
+        for stage_spec in spec.get("augmenters", []):
+            pipeline.add_augmenter(_stage_from_spec("augmenters", stage_spec))
+        return pipeline
+
+    def spec_hash(self):
+        """
+        Computes a stable hash identifying the pipeline configuration.
+
+        Returns:
+            str: The SHA-256 hex digest of the canonical JSON encoding of the spec.
+        """
+        encoded = json.dumps(self.to_spec(), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
     # Clearing methods for processors, augmenters, data preparators, and their timelines.
     # These methods reset respective components to an empty state, useful for reconfiguring the pipeline dynamically.
 
@@ -131,6 +302,18 @@ class ProcessingPipeline:
         """Clears all augmenters from the pipeline."""
         self.augmenters = []
 
+    def clear_processors_timeline(self):
+        """Clears the timeline of the processors."""
+        self.processors_timeline = []
+
+    def clear_data_preparators_timeline(self):
+        """Clears the timeline of the data preparators."""
+        self.data_preparators_timeline = []
+
+    def clear_augmenters_timeline(self):
+        """Clears the timeline of the augmenters."""
+        self.augmenters_timeline = []
+
     def clear_timeline(self):
         """Clears all timelines for processors, data preparators, and augmenters."""
         self.clear_processors_timeline()
@@ -1,13 +1,38 @@
 import cv2 as cv
 
+
+def to_gray(data):
+    """
+    Convert BGR image data to a single grayscale channel, leaving grayscale data untouched.
+
+    Args:
+        data (numpy.ndarray): The image data to be converted.
+
+    Returns:
+        numpy.ndarray: The grayscale image.
+    """
+    return cv.cvtColor(data, cv.COLOR_BGR2GRAY) if len(data.shape) > 2 else data
+
+
 class DataProcessor:
     """
     Base class for data processing operations.
 
     This class provides a framework for processing data and should be subclassed
     to implement specific data processing techniques.
+
+    Attributes:
+        channel_wise (bool): True if converting to grayscale before or after the operation
+            gives exactly the same result. Filters that round each channel to 8 bits (blur,
+            invert) differ by one gray level on some pixels, which Canny turns into different
+            edges, so they are not channel-wise.
+        reduces_to_gray (bool): True if the operation only depends on intensity and outputs
+            a single-channel image.
     """
 
+    channel_wise = False
+    reduces_to_gray = False
+
     def __init__(self):
         """Initialize the data processor."""
         pass
@@ -54,6 +79,32 @@ class GaussianBlurProcessor(DataProcessor):
         """
         return cv.GaussianBlur(data, self.kernel_size, 0)
 
+class GrayscaleProcessor(DataProcessor):
+    """
+    A data processor that converts BGR image data to a single grayscale channel.
+
+    Placed early in a chain ending in an intensity-only stage (e.g. Canny), it lets the
+    following stages run on one channel instead of three.
+    """
+
+    reduces_to_gray = True
+
+    def __init__(self):
+        """Initialize the GrayscaleProcessor."""
+        super().__init__()
+
+    def process(self, data):
+        """
+        Convert the image data to grayscale.
+
+        Args:
+            data (numpy.ndarray): The image data to be converted.
+
+        Returns:
+            numpy.ndarray: The grayscale image.
+        """
+        return to_gray(data)
+
 class MeanAdaptiveThresholdProcessor(DataProcessor):
     """
     A data processor that applies mean adaptive thresholding to the image data.
@@ -63,6 +114,8 @@ class MeanAdaptiveThresholdProcessor(DataProcessor):
         c (int): Constant subtracted from the mean or weighted mean.
     """
 
+    reduces_to_gray = True
+
     def __init__(self, block_size, c):
         """
         Initialize the MeanAdaptiveThresholdProcessor with specific parameters.
@@ -85,8 +138,7 @@ class MeanAdaptiveThresholdProcessor(DataProcessor):
         Returns:
             numpy.ndarray: The thresholded image.
         """
-        _data = cv.cvtColor(data, cv.COLOR_BGR2GRAY) if len(data.shape) > 2 else data
-        return cv.adaptiveThreshold(_data, 255, cv.ADAPTIVE_THRESH_MEAN_C,
+        return cv.adaptiveThreshold(to_gray(data), 255, cv.ADAPTIVE_THRESH_MEAN_C,
                                     cv.THRESH_BINARY, self.block_size, self.c)
 
 class InvertProcessor(DataProcessor):
@@ -119,6 +171,8 @@ class CannyProcessor(DataProcessor):
         threshold2 (int): Second threshold for the hysteresis procedure.
     """
 
+    reduces_to_gray = True
+
     def __init__(self, threshold1, threshold2):
         """
         Initialize the CannyProcessor with specific thresholds.
@@ -133,7 +187,7 @@ class CannyProcessor(DataProcessor):
 
     def process(self, data):
         """
-        Apply Canny edge detection to the image data.
+        Apply Canny edge detection to the intensity of the image data.
 
         Args:
             data (numpy.ndarray): The image data for edge detection.
@@ -141,4 +195,4 @@ class CannyProcessor(DataProcessor):
         Returns:
             numpy.ndarray: The image with detected edges.
         """
-        return cv.Canny(data, self.threshold1, self.threshold2)
+        return cv.Canny(to_gray(data), self.threshold1, self.threshold2)
@@ -0,0 +1,191 @@
+import logging
+import queue
+import threading
+
+import cv2 as cv
+from PIL import Image
+
+# cv.imread decodes every picture to 8-bit BGR.
+DECODED_CHANNELS = 3
+
+
+def estimate_footprint(width, height, pipeline, channels=DECODED_CHANNELS):
+    """
+    Estimate the bytes held in memory while an image goes through the pipeline.
+
+    Counts the decoded original, every data preparation and processing step kept in the
+    timelines, and the augmented variants waiting to be written. Preparators with a `size`
+    attribute (e.g. ResizeDataPreparator) change the image size for the following steps, and
+    steps after the planned grayscale conversion hold a single channel.
+
+    Args:
+        width (int): Width of the original image.
+        height (int): Height of the original image.
+        pipeline (ProcessingPipeline): The pipeline the image will go through.
+        channels (int): Number of 8-bit channels of the image data.
+
+    Returns:
+        int: The estimated footprint in bytes.
+    """
+    pixels = width * height
+    total = pixels * channels
+    gray_at = pipeline.plan_channels()
+    for idx, data_preparator in enumerate(pipeline.data_preparators):
+        if gray_at == ("data_preparators", idx):
+            channels = 1
+        size = getattr(data_preparator, "size", None)
+        if size is not None:
+            pixels = size[0] * size[1]
+        total += pixels * channels
+    for idx, processor in enumerate(pipeline.processors):
+        if gray_at == ("processors", idx) or getattr(processor, "reduces_to_gray", False):
+            channels = 1
+        total += pixels * channels
+    total += len(pipeline.augmenters) * pixels * channels
+    return total
+
+
+class MemoryBudgetScheduler:
+    """
+    Loads images in the background while keeping the estimated memory in flight under a budget.
+
+    An image is admitted (decoded) only if its estimated footprint fits in the remaining budget;
+    otherwise loading waits until the consumer is done with earlier images. An image larger than
+    the whole budget is admitted alone so the run never deadlocks.
+
+    Attributes:
+        pipeline (ProcessingPipeline): The pipeline used to estimate footprints.
+        budget_bytes (int): Maximum estimated bytes in flight.
+        in_flight_bytes (int): Estimated bytes of the images loaded and not yet released.
+        peak_in_flight_bytes (int): Highest value reached by in_flight_bytes.
+    """
+
+    def __init__(self, pipeline, budget_bytes):
+        """
+        Initialize the MemoryBudgetScheduler.
+
+        Args:
+            pipeline (ProcessingPipeline): The pipeline used to estimate footprints.
+            budget_bytes (int): Maximum estimated bytes in flight.
+        """
+        self.pipeline = pipeline
+        self.budget_bytes = budget_bytes
+        self.in_flight_bytes = 0
+        self.peak_in_flight_bytes = 0
+        self._condition = threading.Condition()
+
+    def estimate(self, path):
+        """
+        Estimate the footprint of a picture from its header, without decoding it.
+
+        Args:
+            path (str): Path of the picture.
+
+        Returns:
+            int: The estimated footprint in bytes.
+        """
+        with Image.open(path) as image:
+            width, height = image.size
+        return estimate_footprint(width, height, self.pipeline)
+
+    def acquire(self, nbytes, stop=None):
+        """
+        Block until nbytes fit in the budget, then account for them.
+
+        Args:
+            nbytes (int): Bytes to admit.
+            stop (threading.Event, optional): Event cancelling the wait when set.
+
+        Returns:
+            bool: True if the bytes were admitted, False if the wait was cancelled.
+        """
+        with self._condition:
+            while self.in_flight_bytes > 0 and self.in_flight_bytes + nbytes > self.budget_bytes:
+                if stop is not None and stop.is_set():
+                    return False
+                self._condition.wait()
+            self.in_flight_bytes += nbytes
+            self.peak_in_flight_bytes = max(self.peak_in_flight_bytes, self.in_flight_bytes)
+            return True
+
+    def release(self, nbytes):
+        """
+        Return nbytes to the budget and wake up the loader.
+
+        Args:
+            nbytes (int): Bytes previously admitted with `acquire`.
+        """
+        with self._condition:
+            self.in_flight_bytes -= nbytes
+            self._condition.notify_all()
+
+    def _load(self, picture_paths, loaded, stop):
+        """
+        Load the pictures in order, admitting each one through the budget.
+
+        Args:
+            picture_paths (list): Paths of the pictures to load.
+            loaded (queue.Queue): Queue receiving (image, nbytes) tuples, then None when done.
+            stop (threading.Event): Event set by the consumer to cancel loading.
+        """
+        try:
+            for path in picture_paths:
+                if stop.is_set():
+                    return
+                nbytes = self.estimate(path)
+                if not self.acquire(nbytes, stop):
+                    return
+                loaded.put((cv.imread(path), nbytes))
+            loaded.put(None)
+        except Exception as e:
+            loaded.put(e)
+
+    def load_pictures(self, picture_paths):
+        """
+        Lazily load pictures, prefetching in the background as far as the budget allows.
+
+        The memory of an image is released when the next one is requested, so the consumer
+        must be done with an image (processed and saved) and drop every reference to it before
+        moving to the next, otherwise the budget is not enforced. Closing the
+        generator early (e.g. when processing raises) stops the loader and releases the images
+        it had prefetched.
+
+        Args:
+            picture_paths (list): Paths of the pictures to load.
+
+        Yields:
+            numpy.ndarray: The loaded images, in the order of picture_paths.
+        """
+        loaded = queue.Queue()
+        stop = threading.Event()
+        loader = threading.Thread(
+            target=self._load, args=(picture_paths, loaded, stop), daemon=True
+        )
+        loader.start()
+        try:
+            while True:
+                item = loaded.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                image, nbytes = item
+                try:
+                    yield image
+                finally:
+                    # Drop the generator's own references before handing the bytes back.
+                    item = image = None
+                    self.release(nbytes)
+        finally:
+            stop.set()
+            with self._condition:
+                self._condition.notify_all()
+            loader.join()
+            while not loaded.empty():
+                item = loaded.get_nowait()
+                if isinstance(item, tuple):
+                    self.release(item[1])
+        logging.info(
+            f"Peak memory in flight: {self.peak_in_flight_bytes} bytes "
+            f"(budget {self.budget_bytes} bytes)."
+        )
@@ -0,0 +1,214 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Imported up front, unlike in main.py, so jobs do not pay for it.
+import pandas  # noqa: F401
+
+import main
+from client import SOCKET_PATH
+from pipeline import ProcessingPipeline
+
+
+class PipelineService:
+    """
+    Keeps pipelines and a worker pool warm to run batch jobs without per-run startup cost.
+
+    Each worker thread keeps one pipeline per configuration, keyed by its spec hash, and reuses
+    it for every later job with the same configuration, as pipelines keep per-run timelines and
+    cannot be shared across threads.
+
+    Attributes:
+        workers (int): Number of jobs run concurrently.
+        memory_budget (int): Memory budget of each job, see `main.run_batch`.
+        executor (ThreadPoolExecutor): The worker pool running the jobs.
+    """
+
+    def __init__(self, workers=2, memory_budget=main.MEMORY_BUDGET_BYTES):
+        """
+        Initialize the PipelineService.
+
+        Args:
+            workers (int): Number of jobs run concurrently.
+            memory_budget (int, optional): Total memory budget, split evenly between workers;
+                None loads every picture up front.
+
+        Raises:
+            ValueError: If workers is lower than 1.
+        """
+        if workers < 1:
+            raise ValueError(f"The service needs at least one worker, got {workers}.")
+        self.workers = workers
+        self.memory_budget = memory_budget // workers if memory_budget is not None else None
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._local = threading.local()
+
+    def get_pipeline(self, spec):
+        """
+        Returns the warm pipeline of the current worker thread for the given spec.
+
+        The spec is built and cached under its spec hash, so the same configuration written
+        differently (e.g. with or without empty params) shares one pipeline.
+
+        Args:
+            spec (dict): The pipeline spec.
+
+        Returns:
+            ProcessingPipeline: The warm pipeline.
+        """
+        pipelines = getattr(self._local, "pipelines", None)
+        if pipelines is None:
+            pipelines = self._local.pipelines = {}
+        pipeline = ProcessingPipeline.from_spec(spec)
+        return pipelines.setdefault(pipeline.spec_hash(), pipeline)
+
+    def run_job(self, job):
+        """
+        Runs a batch job on the current worker thread.
+
+        Args:
+            job (dict): The job, with input_folder, output_folder, csv_filename and an
+                optional pipeline spec.
+
+        Returns:
+            dict: The result of the job.
+        """
+        start = time.perf_counter()
+        pipeline = self.get_pipeline(job.get("spec", main.PIPELINE_SPEC))
+        os.makedirs(job["output_folder"], exist_ok=True)
+        processed_info = main.run_batch(
+            pipeline,
+            job["input_folder"],
+            job["output_folder"],
+            job["csv_filename"],
+            self.memory_budget,
+        )
+        return {
+            "status": "ok",
+            "images": len(processed_info),
+            "csv_filename": job["csv_filename"],
+            "spec_hash": pipeline.spec_hash(),
+            "seconds": time.perf_counter() - start,
+        }
+
+    def submit(self, job):
+        """
+        Runs a batch job on the worker pool and waits for its result.
+
+        Args:
+            job (dict): The job to run, see `run_job`.
+
+        Returns:
+            dict: The result of the job, or an error response if it failed.
+        """
+        try:
+            return self.executor.submit(self.run_job, job).result()
+        except Exception as e:
+            logging.exception("Job failed.")
+            return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+    def shutdown(self):
+        """Waits for the running jobs and stops the worker pool."""
+        self.executor.shutdown(wait=True)
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON job per line from the connection and writes one JSON result per line."""
+
+    def handle(self):
+        """Handle the jobs sent on the connection until the client closes it."""
+        for line in self.rfile:
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                result = {"status": "error", "error": f"Invalid job: {e}"}
+            else:
+                result = self.server.service.submit(job)
+            self.wfile.write(json.dumps(result).encode("utf-8") + b"\n")
+
+
+def remove_stale_socket(socket_path):
+    """
+    Removes a socket file left behind by a service that is no longer running.
+
+    Args:
+        socket_path (str): Path of the existing socket file.
+
+    Raises:
+        FileExistsError: If the path is not a socket, or a service is still listening on it.
+    """
+    if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+        raise FileExistsError(f"{socket_path} exists and is not a socket.")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+    raise FileExistsError(f"A service is already listening on {socket_path}.")
+
+
+class PipelineServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    A Unix socket server handing jobs to a PipelineService.
+
+    Attributes:
+        service (PipelineService): The service running the jobs.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, service):
+        """
+        Initialize the PipelineServer, replacing a stale socket file if needed.
+
+        Args:
+            socket_path (str): Path of the Unix socket to listen on.
+            service (PipelineService): The service running the jobs.
+
+        Raises:
+            FileExistsError: If the path exists and is not a socket, or is the socket of a
+                service that is still running.
+        """
+        # Set before binding: a failed bind calls server_close, which stops the service.
+        self.service = service
+        if os.path.exists(socket_path):
+            remove_stale_socket(socket_path)
+        super().__init__(socket_path, JobHandler)
+
+    def server_close(self):
+        """Close the server, stop the service and remove the socket file."""
+        super().server_close()
+        self.service.shutdown()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def main_service(argv=None):
+    """
+    Main function to start the pipeline service and serve jobs until interrupted.
+    """
+    parser = argparse.ArgumentParser(description="Serve batch jobs over a Unix socket.")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket to listen on.")
+    parser.add_argument("--workers", type=int, default=2, help="Number of concurrent jobs.")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1.")
+
+    with PipelineServer(args.socket, PipelineService(args.workers)) as server:
+        logging.info(f"Serving pipeline jobs on {args.socket}.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Shutting down.")
+
+
+if __name__ == "__main__":
+    main_service()
@@ -1,4 +1,11 @@
 import unittest
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import tracemalloc
 from unittest.mock import MagicMock
 import numpy as np
 import cv2 as cv
@@ -7,10 +14,24 @@ from pipeline import ProcessingPipeline
 import processors as pr
 import data_preparators as dp
 import augmenters as ag
+import deduplicators as dd
+import scheduler as sc
+import client
+import main
+import service
 
 from PIL import Image
 
 
+class FlipProcessor(pr.DataProcessor):
+    """Flips the image; moving pixels around commutes exactly with the grayscale conversion."""
+
+    channel_wise = True
+
+    def process(self, data):
+        return cv.flip(data, 1)
+
+
 class TestImageProcessing(unittest.TestCase):
     def setUp(self):
         np.random.seed(0)
@@ -84,5 +105,302 @@ class TestImageProcessing(unittest.TestCase):
         for img in final_images:
             self.assertEqual(img.shape, (5, 5, 3))
 
+    def test_pipeline_spec_round_trip(self):
+        pipeline = ProcessingPipeline()
+        pipeline.add_data_preparator(dp.ResizeDataPreparator((5, 5)))
+        pipeline.add_processor(pr.GaussianBlurProcessor((5, 5)))
+        pipeline.add_processor(pr.CannyProcessor(100, 200))
+        pipeline.add_augmenter(ag.FlipAugmenter(1))
+
+        spec = json.loads(json.dumps(pipeline.to_spec()))
+        rebuilt = ProcessingPipeline.from_spec(spec)
+        self.assertEqual(rebuilt.to_spec(), pipeline.to_spec())
+        self.assertEqual(rebuilt.spec_hash(), pipeline.spec_hash())
+        self.assertEqual(rebuilt.processors[0].kernel_size, (5, 5))
+        for expected, actual in zip(pipeline.run(self.test_image.copy()),
+                                    rebuilt.run(self.test_image.copy())):
+            np.testing.assert_array_equal(expected, actual)
+
+        rebuilt.add_augmenter(ag.RotateAugmenter(90))
+        self.assertNotEqual(rebuilt.spec_hash(), pipeline.spec_hash())
+
+    def test_pipeline_spec_unknown_type(self):
+        with self.assertRaises(ValueError):
+            ProcessingPipeline.from_spec({"processors": [{"type": "Missing", "params": {}}]})
+
+    def test_plan_channels(self):
+        pipeline = ProcessingPipeline()
+        pipeline.add_data_preparator(dp.ResizeDataPreparator((5, 5)))
+        pipeline.add_processor(pr.GaussianBlurProcessor((5, 5)))
+        pipeline.add_processor(pr.CannyProcessor(100, 200))
+        # Blur rounds each channel, so the conversion stays with Canny.
+        self.assertIsNone(pipeline.plan_channels())
+
+        pipeline.clear_processors()
+        pipeline.add_processor(FlipProcessor())
+        pipeline.add_processor(FlipProcessor())
+        pipeline.add_processor(pr.CannyProcessor(100, 200))
+        self.assertEqual(pipeline.plan_channels(), ("processors", 0))
+
+    def test_pipeline_runs_on_gray_after_planning(self):
+        pipeline, unplanned = ProcessingPipeline(), ProcessingPipeline()
+        for _pipeline in (pipeline, unplanned):
+            _pipeline.add_data_preparator(dp.ResizeDataPreparator((5, 5)))
+            _pipeline.add_processor(FlipProcessor())
+            _pipeline.add_processor(pr.MeanAdaptiveThresholdProcessor(3, 5))
+            _pipeline.add_augmenter(ag.FlipAugmenter(1))
+        unplanned.plan_channels = lambda: None
+
+        final_images = pipeline.run(self.test_image.copy())
+        self.assertEqual(pipeline.processors_timeline[1].shape, (5, 5))
+        for expected, actual in zip(unplanned.run(self.test_image.copy()), final_images):
+            np.testing.assert_array_equal(actual, expected)
+
+    def test_canny_uses_intensity(self):
+        processor = pr.CannyProcessor(100, 200)
+        np.testing.assert_array_equal(
+            processor.process(self.test_image),
+            processor.process(cv.cvtColor(self.test_image, cv.COLOR_BGR2GRAY)))
+
+    def test_default_chain_unchanged_by_planning(self):
+        image = cv.resize(self.test_image, (500, 400), interpolation=cv.INTER_NEAREST)
+        planned = main.initialize_pipeline()
+        unplanned = main.initialize_pipeline()
+        unplanned.plan_channels = lambda: None
+        for expected, actual in zip(unplanned.run(image), planned.run(image)):
+            np.testing.assert_array_equal(actual, expected)
+
+
+class TestDeduplication(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.test_image = (np.random.rand(64, 64, 3) * 255).astype('uint8')
+
+    def test_dhash_near_duplicate(self):
+        noisy_image = cv.GaussianBlur(self.test_image, (3, 3), 0)
+        distance = dd.hamming_distance(dd.dhash(self.test_image), dd.dhash(noisy_image))
+        self.assertLessEqual(distance, 10)
+        inverted = dd.dhash(cv.bitwise_not(self.test_image))
+        self.assertGreater(dd.hamming_distance(dd.dhash(self.test_image), inverted), 32)
+
+    def test_hash_index_find(self):
+        index = dd.HashIndex()
+        for value, key in [(0b0000, 'a'), (0b1111, 'b'), (0b0011, 'c')]:
+            index.add(value, key)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.find(0b0001, 1), ('a', 1))
+        self.assertEqual(index.find(0b1110, 1), ('b', 1))
+        self.assertIsNone(index.find(0b0101, 0))
+
+    def test_deduplicator_check(self):
+        deduplicator = dd.PerceptualDeduplicator(5)
+        self.assertIsNone(deduplicator.check(self.test_image, 'first.jpg'))
+        self.assertEqual(deduplicator.check(self.test_image.copy(), 'second.jpg'), 'first.jpg')
+        self.assertIsNone(deduplicator.check(np.fliplr(self.test_image).copy(), 'third.jpg'))
+        self.assertEqual(len(deduplicator.index), 2)
+
+
+class TestMemoryBudgetScheduler(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = ProcessingPipeline()
+        self.pipeline.add_data_preparator(dp.ResizeDataPreparator((5, 5)))
+        self.pipeline.add_processor(pr.InvertProcessor())
+        self.pipeline.add_augmenter(ag.FlipAugmenter(1))
+
+    def test_estimate_footprint(self):
+        # original 10x10, resized 5x5, one processor and one augmenter on 5x5
+        expected = 10 * 10 * 3 + 3 * (5 * 5 * 3)
+        self.assertEqual(sc.estimate_footprint(10, 10, self.pipeline), expected)
+
+    def test_estimate_footprint_duck_typed_stage(self):
+        class IdentityProcessor:
+            def process(self, data):
+                return data
+
+        self.pipeline.add_processor(IdentityProcessor())
+        expected = 10 * 10 * 3 + 4 * (5 * 5 * 3)
+        self.assertEqual(sc.estimate_footprint(10, 10, self.pipeline), expected)
+
+    def test_load_pictures_under_budget(self):
+        with tempfile.TemporaryDirectory() as folder:
+            paths = []
+            for idx in range(4):
+                path = os.path.join(folder, f"cat_{idx}.png")
+                cv.imwrite(path, np.full((10, 10, 3), idx, dtype=np.uint8))
+                paths.append(path)
+            footprint = sc.estimate_footprint(10, 10, self.pipeline)
+            scheduler = sc.MemoryBudgetScheduler(self.pipeline, 2 * footprint)
+
+            for idx, image in enumerate(scheduler.load_pictures(paths)):
+                self.assertEqual(image[0, 0, 0], idx)
+                self.assertLessEqual(scheduler.in_flight_bytes, 2 * footprint)
+            self.assertEqual(scheduler.in_flight_bytes, 0)
+            self.assertLessEqual(scheduler.peak_in_flight_bytes, 2 * footprint)
+
+    def test_real_peak_memory_stays_within_budget(self):
+        with tempfile.TemporaryDirectory() as folder:
+            paths = []
+            for idx in range(4):
+                path = os.path.join(folder, f"cat_{idx}.png")
+                image = np.zeros((1000, 1000, 3), dtype=np.uint8)
+                cv.circle(image, (500, 500), 100 * (idx + 1), (255, 40 * idx, 0), -1)
+                cv.imwrite(path, image)
+                paths.append(path)
+            pipeline = main.initialize_pipeline()
+            footprint = sc.estimate_footprint(1000, 1000, pipeline)
+            scheduler = sc.MemoryBudgetScheduler(pipeline, footprint)
+
+            tracemalloc.start()
+            try:
+                main.process_images(pipeline, scheduler.load_pictures(paths), paths, folder)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            # A little headroom for the temporaries of the OpenCV calls.
+            self.assertLess(peak, 1.25 * footprint)
+
+    def test_stopping_early_cancels_loader(self):
+        with tempfile.TemporaryDirectory() as folder:
+            paths = []
+            for idx in range(6):
+                path = os.path.join(folder, f"cat_{idx}.png")
+                cv.imwrite(path, np.full((10, 10, 3), idx, dtype=np.uint8))
+                paths.append(path)
+            footprint = sc.estimate_footprint(10, 10, self.pipeline)
+            scheduler = sc.MemoryBudgetScheduler(self.pipeline, 2 * footprint)
+            threads_before = set(threading.enumerate())
+
+            pictures = scheduler.load_pictures(paths)
+            next(pictures)
+            loaders = set(threading.enumerate()) - threads_before
+            self.assertEqual(len(loaders), 1)
+            pictures.close()
+
+            self.assertFalse(loaders.pop().is_alive())
+            self.assertEqual(scheduler.in_flight_bytes, 0)
+
+    def test_oversized_image_is_admitted_alone(self):
+        scheduler = sc.MemoryBudgetScheduler(self.pipeline, 10)
+        scheduler.acquire(100)
+        self.assertEqual(scheduler.in_flight_bytes, 100)
+        scheduler.release(100)
+        self.assertEqual(scheduler.in_flight_bytes, 0)
+
+
+class TestPipelineService(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.input_folder = os.path.join(self.folder.name, "pictures")
+        os.makedirs(self.input_folder)
+        np.random.seed(0)
+        for idx in range(2):
+            image = (np.random.rand(20, 20, 3) * 255).astype('uint8')
+            cv.imwrite(os.path.join(self.input_folder, f"cat_{idx}.png"), image)
+        # Budget of two pictures, so the loader has to wait for the consumer.
+        footprint = sc.estimate_footprint(20, 20, ProcessingPipeline.from_spec(main.PIPELINE_SPEC))
+        pipeline_service = service.PipelineService(workers=1, memory_budget=2 * footprint)
+        self.socket_path = os.path.join(self.folder.name, "service.sock")
+        self.server = service.PipelineServer(self.socket_path, pipeline_service)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.folder.cleanup()
+
+    def test_submit_jobs_reuses_pipeline(self):
+        job = {
+            "input_folder": self.input_folder,
+            "output_folder": os.path.join(self.folder.name, "out"),
+            "csv_filename": os.path.join(self.folder.name, "images.csv"),
+        }
+        first = client.submit(job, self.socket_path)
+        self.assertEqual(first["status"], "ok")
+        self.assertEqual(first["images"], 10)
+        self.assertTrue(os.path.exists(job["csv_filename"]))
+        self.assertEqual(len(os.listdir(job["output_folder"])), 10)
+
+        second = client.submit(job, self.socket_path)
+        self.assertEqual(second["spec_hash"], first["spec_hash"])
+        pipeline_service = self.server.service
+        pipelines = [
+            pipeline_service.executor.submit(pipeline_service.get_pipeline, main.PIPELINE_SPEC).result()
+            for _ in range(2)
+        ]
+        self.assertIs(pipelines[0], pipelines[1])
+
+    def test_submit_invalid_job(self):
+        result = client.submit({"input_folder": "missing"}, self.socket_path)
+        self.assertEqual(result["status"], "error")
+
+    def test_failed_job_does_not_leak_threads(self):
+        job = {
+            "input_folder": self.input_folder,
+            "output_folder": os.path.join(self.folder.name, "out"),
+            "csv_filename": os.path.join(self.folder.name, "images.csv"),
+        }
+        # Start the worker thread up front, connection handler threads end on their own.
+        self.server.service.executor.submit(lambda: None).result()
+        threads_before = threading.active_count()
+
+        # Valid header but truncated data: cv.imread returns None and processing fails.
+        for idx in range(2, 6):
+            cv.imwrite(os.path.join(self.input_folder, f"cat_{idx}.png"), self.image(idx))
+        with open(os.path.join(self.input_folder, "cat_1.png"), "r+b") as picture:
+            picture.truncate(100)
+        self.assertEqual(client.submit(job, self.socket_path)["status"], "error")
+
+        deadline = time.monotonic() + 5
+        while threading.active_count() > threads_before and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(threading.active_count(), threads_before)
+
+    def test_refuses_live_socket_and_regular_file(self):
+        with self.assertRaises(FileExistsError):
+            service.PipelineServer(self.socket_path, service.PipelineService(workers=1))
+        regular_file = os.path.join(self.folder.name, "not-a-socket")
+        open(regular_file, "w").close()
+        with self.assertRaises(FileExistsError):
+            service.PipelineServer(regular_file, service.PipelineService(workers=1))
+        self.assertTrue(os.path.exists(regular_file))
+
+    def test_replaces_stale_socket(self):
+        stale_path = os.path.join(self.folder.name, "stale.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(stale_path)
+        stale.close()
+        server = service.PipelineServer(stale_path, service.PipelineService(workers=1))
+        server.server_close()
+        self.assertFalse(os.path.exists(stale_path))
+
+    def test_bind_failure_raises_and_stops_service(self):
+        pipeline_service = service.PipelineService(workers=1)
+        with self.assertRaises(FileNotFoundError):
+            service.PipelineServer(os.path.join(self.folder.name, "missing", "x.sock"),
+                                   pipeline_service)
+        with self.assertRaises(RuntimeError):
+            pipeline_service.executor.submit(lambda: None)
+
+    def test_equivalent_specs_share_pipeline(self):
+        pipeline_service = self.server.service
+        spec = {"processors": [{"type": "InvertProcessor", "params": {}},
+                               {"type": "GaussianBlurProcessor", "params": {"kernel_size": [5, 5]}}]}
+        equivalent = {"data_preparators": [], "augmenters": [],
+                      "processors": [{"type": "InvertProcessor"},
+                                     {"type": "GaussianBlurProcessor", "params": {"kernel_size": (5, 5)}}]}
+        pipelines = [pipeline_service.executor.submit(pipeline_service.get_pipeline, _spec).result()
+                     for _spec in (spec, equivalent)]
+        self.assertIs(pipelines[0], pipelines[1])
+
+    def test_rejects_no_workers(self):
+        with self.assertRaises(ValueError):
+            service.PipelineService(workers=0)
+
+    @staticmethod
+    def image(seed):
+        np.random.seed(seed)
+        return (np.random.rand(20, 20, 3) * 255).astype('uint8')
+
+
 if __name__ == '__main__':
     unittest.main()